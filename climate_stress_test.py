@@ -6,14 +6,19 @@ Reads an Excel file 'portfolio_climat.xlsx' containing:
 - Sheet 'Portfolio' (loan-level data)
 - Sheet 'Scenario_Uplifts' (sector x scenario uplifts for PD and LGD)
 
-Outputs:
-- results_<Scenario>.csv (loan-level results)
+Outputs (.csv by default; .parquet or both with --format):
+- results_<Scenario>.csv (loan-level results, skipped with --no-loan-level)
 - summary_by_sector_<Scenario>.csv
 - summary_by_country_<Scenario>.csv
+- summary_by_region_<Scenario>.csv
 - climate_var_summary.csv
 
 Usage:
     python climate_stress_test.py --input portfolio_climat.xlsx --alpha 0.95
+    python climate_stress_test.py --input portfolio_climat.xlsx --cache   # reuse parsed sheets on reruns
+    python climate_stress_test.py --input portfolio_climat.xlsx --format parquet
+    python climate_stress_test.py --input portfolio_climat.xlsx --chunksize 100000   # bounded memory
+    python climate_stress_test.py --input portfolio_climat.xlsx --no-loan-level      # summaries and VaR only
 
 Notes:
 - This is a simplified pedagogical model (uplifts are assumed inputs).
@@ -23,14 +28,63 @@ Notes:
 from __future__ import annotations
 
 import argparse
+import glob
+import hashlib
+import os
+import re
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from itertools import islice
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from src._kernels import NUMBA_AVAILABLE, group_agg, stress_kernel
 
 
 SCENARIOS = ["Optimiste", "Neutre", "Pessimiste"]
+SUMMARY_DIMENSIONS = ["sector", "country", "region"]
+
+# Column dtypes enforced at parse time (no post-load conversion needed).
+# Rates and maturities are float32 to halve memory traffic; EAD stays float64
+# so that exposure and loss totals keep full precision.
+PORTFOLIO_DTYPES = {
+    "loan_id": "string",
+    "sector": "string",
+    "country": "string",
+    "region": "string",
+    "EAD_EUR": "float64",
+    "PD_base": "float32",
+    "LGD": "float32",
+    "maturity_years": "float32",
+}
+UPLIFTS_DTYPES = {
+    "sector": "string",
+    **{f"{kind}_uplift_{sc}": "float32" for kind in ("pd", "lgd") for sc in SCENARIOS},
+}
+
+# Prefer the Rust-based calamine reader; fall back to openpyxl in read-only mode
+try:
+    import python_calamine  # noqa: F401
+
+    EXCEL_ENGINE = "calamine"
+    EXCEL_ENGINE_KWARGS: dict = {}
+except ImportError:
+    EXCEL_ENGINE = "openpyxl"
+    EXCEL_ENGINE_KWARGS = {"read_only": True}
+
+# Without Numba, NumExpr still evaluates the stress arithmetic blockwise without temporaries
+try:
+    import numexpr as ne
+
+    NUMEXPR_AVAILABLE = True
+except ImportError:
+    NUMEXPR_AVAILABLE = False
 
 
 @dataclass(frozen=True)
@@ -40,15 +94,72 @@ class StressTestConfig:
 
 
 def _require_columns(df: pd.DataFrame, cols: list[str], name: str) -> None:
-    missing = [c for c in cols if c not in df.columns]
+    missing = sorted(set(cols).difference(df.columns))
     if missing:
         raise ValueError(f"Missing columns in {name}: {missing}")
 
 
-def load_inputs(xlsx_path: Path) -> tuple[pd.DataFrame, pd.DataFrame]:
-    """Load Portfolio and Scenario_Uplifts sheets."""
-    portfolio = pd.read_excel(xlsx_path, sheet_name="Portfolio")
-    uplifts = pd.read_excel(xlsx_path, sheet_name="Scenario_Uplifts")
+def _read_workbook(xlsx_path: Path) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Parse Portfolio and Scenario_Uplifts sheets from the Excel file."""
+    # Open the workbook once and parse both sheets from the same handle
+    with pd.ExcelFile(xlsx_path, engine=EXCEL_ENGINE, engine_kwargs=EXCEL_ENGINE_KWARGS) as xl:
+        portfolio = xl.parse("Portfolio", dtype=PORTFOLIO_DTYPES)
+        uplifts = xl.parse("Scenario_Uplifts", dtype=UPLIFTS_DTYPES)
+
+    # calamine keeps trailing formatted-but-empty rows that openpyxl skips
+    portfolio = portfolio.dropna(how="all").reset_index(drop=True)
+    uplifts = uplifts.dropna(how="all").reset_index(drop=True)
+    return portfolio, uplifts
+
+
+# Bump when the cached frames change shape in a way the dtype maps do not capture
+CACHE_VERSION = 1
+
+
+def _cache_paths(xlsx_path: Path) -> tuple[Path, Path]:
+    """Parquet sidecar paths, keyed by the workbook's mtime and size and the parse schema."""
+    st = xlsx_path.stat()
+    schema = repr((CACHE_VERSION, sorted(PORTFOLIO_DTYPES.items()), sorted(UPLIFTS_DTYPES.items())))
+    tag = hashlib.sha1(schema.encode()).hexdigest()[:8]
+    key = f"{st.st_mtime_ns}_{st.st_size}_{tag}"
+    return (
+        xlsx_path.with_name(f"{xlsx_path.name}.{key}.portfolio.parquet"),
+        xlsx_path.with_name(f"{xlsx_path.name}.{key}.uplifts.parquet"),
+    )
+
+
+def _write_cache(frame: pd.DataFrame, path: Path, xlsx_path: Path, kind: str) -> None:
+    """Write a sidecar atomically, then drop sidecars of the same kind left by older keys."""
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        frame.to_parquet(tmp, engine="pyarrow", compression="zstd", index=False)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+    sidecar = re.compile(rf"{re.escape(xlsx_path.name)}\.\d+_\d+(_[0-9a-f]+)?\.{kind}\.parquet")
+    for old in xlsx_path.parent.glob(f"{glob.escape(xlsx_path.name)}.*.{kind}.parquet"):
+        if old != path and sidecar.fullmatch(old.name):
+            old.unlink(missing_ok=True)
+
+
+def load_inputs(xlsx_path: Path, cache: bool = False) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Load Portfolio and Scenario_Uplifts sheets.
+
+    With cache=True, parsed sheets are stored as Parquet next to the workbook
+    and reused on later runs as long as the workbook is unchanged.
+    """
+    if cache:
+        portfolio_pq, uplifts_pq = _cache_paths(xlsx_path)
+        if portfolio_pq.exists() and uplifts_pq.exists():
+            portfolio = pd.read_parquet(portfolio_pq, engine="pyarrow")
+            uplifts = pd.read_parquet(uplifts_pq, engine="pyarrow")
+        else:
+            portfolio, uplifts = _read_workbook(xlsx_path)
+            _write_cache(portfolio, portfolio_pq, xlsx_path, "portfolio")
+            _write_cache(uplifts, uplifts_pq, xlsx_path, "uplifts")
+    else:
+        portfolio, uplifts = _read_workbook(xlsx_path)
 
     _require_columns(
         portfolio,
@@ -65,96 +176,509 @@ def load_inputs(xlsx_path: Path) -> tuple[pd.DataFrame, pd.DataFrame]:
         "Scenario_Uplifts",
     )
 
-    # Normalize dtypes
-    portfolio["sector"] = portfolio["sector"].astype(str)
-    portfolio["country"] = portfolio["country"].astype(str)
-    portfolio["region"] = portfolio["region"].astype(str)
-    portfolio["EAD_EUR"] = pd.to_numeric(portfolio["EAD_EUR"], errors="raise")
-    portfolio["PD_base"] = pd.to_numeric(portfolio["PD_base"], errors="raise")
-    portfolio["LGD"] = pd.to_numeric(portfolio["LGD"], errors="raise")
-    portfolio["maturity_years"] = pd.to_numeric(portfolio["maturity_years"], errors="raise")
-
-    uplifts["sector"] = uplifts["sector"].astype(str)
+    # Categorical keys: integer codes drive the uplift lookup and the groupbys
+    for col in ("sector", "country", "region"):
+        portfolio[col] = portfolio[col].astype("category")
 
     return portfolio, uplifts
 
 
-def apply_scenario(
+RESULT_COLUMNS = [
+    "scenario", "loan_id", "sector", "country", "region",
+    "EAD_EUR", "PD_base", "PD_stress", "dPD",
+    "LGD", "LGD_stress",
+    "maturity_years",
+    "pd_uplift", "lgd_uplift",
+    "loss_projected",
+]
+
+
+def _iter_sheet_rows(xlsx_path: Path, sheet_name: str) -> Iterator[tuple]:
+    """
+    Yield raw sheet rows (header first) without building a DataFrame; empty cells are None.
+
+    openpyxl in read-only mode streams rows from the file, so memory stays flat.
+    Without openpyxl, calamine is used: it yields rows lazily but loads the whole
+    sheet range into memory first, so memory is then bounded by the sheet size.
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        from python_calamine import CalamineWorkbook
+
+        wb = CalamineWorkbook.from_path(str(xlsx_path))
+        try:
+            for row in wb.get_sheet_by_name(sheet_name).iter_rows():
+                yield tuple(None if v == "" else v for v in row)
+        finally:
+            wb.close()
+        return
+
+    wb = load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        yield from wb[sheet_name].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def iter_portfolio_chunks(xlsx_path: Path, chunksize: int) -> Iterator[pd.DataFrame]:
+    """
+    Yield the Portfolio sheet as DataFrames of at most `chunksize` loans.
+
+    Chunks carry the same dtypes as load_inputs (categorical keys are per chunk).
+    A sheet without loans yields a single empty chunk, so callers still produce
+    (empty) outputs.
+    """
+    if chunksize < 1:
+        raise ValueError(f"chunksize must be a positive integer, got {chunksize}")
+
+    rows = _iter_sheet_rows(xlsx_path, "Portfolio")
+    header = list(next(rows, ()))
+    _require_columns(pd.DataFrame(columns=header), list(PORTFOLIO_DTYPES), "Portfolio")
+
+    def _typed(chunk: pd.DataFrame) -> pd.DataFrame:
+        chunk = chunk.astype(PORTFOLIO_DTYPES)
+        for col in ("sector", "country", "region"):
+            chunk[col] = chunk[col].astype("category")
+        return chunk.reset_index(drop=True)
+
+    empty = True
+    while batch := list(islice(rows, chunksize)):
+        chunk = pd.DataFrame(batch, columns=header).dropna(how="all")
+        if chunk.empty:
+            continue
+        empty = False
+        yield _typed(chunk)
+
+    if empty:
+        yield _typed(pd.DataFrame(columns=header))
+
+
+def _gather_uplifts(
     portfolio: pd.DataFrame,
     uplifts: pd.DataFrame,
-    scenario: str,
+    scenarios: list[str],
+) -> tuple[np.ndarray, np.ndarray]:
+    """Per-loan PD and LGD uplifts as (n_scenarios, n_loans) arrays."""
+    unknown = [sc for sc in scenarios if sc not in SCENARIOS]
+    if unknown:
+        raise ValueError(f"Unknown scenario '{unknown[0]}'. Must be one of: {SCENARIOS}")
+
+    pd_cols = [f"pd_uplift_{sc}" for sc in scenarios]
+    lgd_cols = [f"lgd_uplift_{sc}" for sc in scenarios]
+
+    # Map each sector category to its uplift row once via a plain dict (the uplift
+    # table is a handful of rows), then gather per loan via the codes
+    # (the trailing -1 sends NaN sectors, code -1, to "missing")
+    sector = portfolio["sector"].astype("category")
+    row_of = {s: i for i, s in enumerate(uplifts["sector"])}
+    cat_rows = np.array([row_of.get(c, -1) for c in sector.cat.categories], dtype=np.intp)
+    rows = np.append(cat_rows, -1)[sector.cat.codes.to_numpy()]
+
+    # Keep the callers' precision: float32 for frames from load_inputs, float64 for plain ones
+    dtypes = [portfolio["PD_base"].dtype, portfolio["LGD"].dtype, *uplifts[pd_cols + lgd_cols].dtypes]
+    dtype = np.result_type(np.float32, *(getattr(d, "numpy_dtype", d) for d in dtypes))
+
+    missing = rows < 0
+    if not missing.any():
+        # (n_scenarios, n_loans) layout: each scenario is a contiguous block of the long form
+        pd_uplift = uplifts[pd_cols].to_numpy(dtype=dtype).T[:, rows]
+        lgd_uplift = uplifts[lgd_cols].to_numpy(dtype=dtype).T[:, rows]
+
+        # Blank uplift cells are missing too, not a zero uplift
+        missing = np.isnan(pd_uplift).any(axis=0) | np.isnan(lgd_uplift).any(axis=0)
+
+    if missing.any():
+        missing_sectors = sector[missing].unique().tolist()
+        raise ValueError(f"Missing uplifts for sectors: {missing_sectors}")
+
+    return pd_uplift, lgd_uplift
+
+
+def _compute_losses(
+    pd_base: np.ndarray,
+    lgd: np.ndarray,
+    ead: np.ndarray,
+    pd_uplift: np.ndarray,
+    lgd_uplift: np.ndarray,
+    cap_pd: float,
+) -> dict[str, np.ndarray]:
+    """
+    Stressed PD/LGD, dPD and projected losses on raw arrays.
+
+    pd_base, lgd, ead are (n_loans,); uplifts and results are (n_scenarios, n_loans).
+    Uses the fused Numba kernel, with NumExpr then NumPy as fallbacks.
+    """
+    if NUMBA_AVAILABLE:
+        pd_stress = np.empty_like(pd_uplift)
+        lgd_stress = np.empty_like(pd_uplift)
+        dpd = np.empty_like(pd_uplift)
+        loss = np.empty(pd_uplift.shape, dtype="float64")
+        stress_kernel(pd_base, lgd, ead, pd_uplift, lgd_uplift, cap_pd, pd_stress, lgd_stress, dpd, loss)
+    else:
+        # Same precision as the kernel: float64 arithmetic, rates stored in the input dtype
+        rate_dtype = pd_uplift.dtype
+        pd_base, lgd, pd_uplift, lgd_uplift = (
+            a.astype(np.float64, copy=False) for a in (pd_base, lgd, pd_uplift, lgd_uplift)
+        )
+
+        if NUMEXPR_AVAILABLE:
+            clip = "where(x < 0, 0, where(x > cap, cap, x))"
+
+            pd_stress = ne.evaluate("pd_base * (1 + pd_uplift)")
+            ne.evaluate(clip, local_dict={"x": pd_stress, "cap": float(cap_pd)}, out=pd_stress)
+            lgd_stress = ne.evaluate("lgd * (1 + lgd_uplift)")
+            ne.evaluate(clip, local_dict={"x": lgd_stress, "cap": 1.0}, out=lgd_stress)
+
+            dpd = ne.evaluate("pd_stress - pd_base")
+            ne.evaluate("where(dpd < 0, 0, dpd)", out=dpd)
+            loss = ne.evaluate("ead * dpd * lgd_stress")
+        else:
+            # Stress PD and LGD (relative uplifts)
+            pd_stress = np.clip(pd_base * (1.0 + pd_uplift), 0.0, cap_pd)
+            lgd_stress = np.clip(lgd * (1.0 + lgd_uplift), 0.0, 1.0)
+
+            # Delta PD (only the climate-driven increase)
+            dpd = np.maximum(pd_stress - pd_base, 0.0)
+
+            # Projected losses (simple stress-test loss proxy)
+            # Loss = EAD * dPD * LGD_stress
+            loss = ead * dpd * lgd_stress
+
+        pd_stress, lgd_stress, dpd = (a.astype(rate_dtype) for a in (pd_stress, lgd_stress, dpd))
+
+    return {"PD_stress": pd_stress, "LGD_stress": lgd_stress, "dPD": dpd, "loss_projected": loss}
+
+
+def apply_scenarios(
+    portfolio: pd.DataFrame,
+    uplifts: pd.DataFrame,
+    scenarios: list[str] = SCENARIOS,
     cfg: StressTestConfig = StressTestConfig(),
 ) -> pd.DataFrame:
-    """Return loan-level dataframe with stressed PD/LGD and projected losses."""
-    if scenario not in SCENARIOS:
-        raise ValueError(f"Unknown scenario '{scenario}'. Must be one of: {SCENARIOS}")
-
-    pd_col = f"pd_uplift_{scenario}"
-    lgd_col = f"lgd_uplift_{scenario}"
-
-    u = uplifts[["sector", pd_col, lgd_col]].rename(
-        columns={pd_col: "pd_uplift", lgd_col: "lgd_uplift"}
+    """Return long-form (loan x scenario) dataframe with stressed PD/LGD and projected losses.
+
+    All scenarios are computed in a single pass: one sector lookup, then
+    (n_scenarios, n_loans) arrays stressed by a fused Numba kernel (NumExpr,
+    then NumPy, as fallbacks without Numba). Rows are ordered scenario by scenario.
+    """
+    pd_uplift, lgd_uplift = _gather_uplifts(portfolio, uplifts, scenarios)
+    res = _compute_losses(
+        portfolio["PD_base"].to_numpy(),
+        portfolio["LGD"].to_numpy(),
+        portfolio["EAD_EUR"].to_numpy(),
+        pd_uplift,
+        lgd_uplift,
+        cfg.cap_pd,
     )
 
-    df = portfolio.merge(u, on="sector", how="left")
-    if df["pd_uplift"].isna().any() or df["lgd_uplift"].isna().any():
-        missing_sectors = df.loc[df["pd_uplift"].isna() | df["lgd_uplift"].isna(), "sector"].unique().tolist()
-        raise ValueError(f"Missing uplifts for sectors: {missing_sectors}")
+    # Long form: repeat loan attributes once per scenario, flatten arrays scenario-major
+    n = len(portfolio)
+    out = portfolio.iloc[np.tile(np.arange(n), len(scenarios))].reset_index(drop=True)
+    out["scenario"] = pd.Categorical.from_codes(np.repeat(np.arange(len(scenarios)), n), categories=scenarios)
+    out["pd_uplift"] = pd_uplift.ravel()
+    out["lgd_uplift"] = lgd_uplift.ravel()
+    for col, arr in res.items():
+        out[col] = arr.ravel()
 
-    # Stress PD and LGD (relative uplifts)
-    df["PD_stress"] = np.clip(df["PD_base"] * (1.0 + df["pd_uplift"]), 0.0, cfg.cap_pd)
-    df["LGD_stress"] = np.clip(df["LGD"] * (1.0 + df["lgd_uplift"]), 0.0, 1.0)
+    return out[RESULT_COLUMNS]
 
-    # Delta PD (only the climate-driven increase)
-    df["dPD"] = np.maximum(df["PD_stress"] - df["PD_base"], 0.0)
 
-    # Projected losses (simple stress-test loss proxy)
-    # Loss = EAD * dPD * LGD_stress
-    df["loss_projected"] = df["EAD_EUR"] * df["dPD"] * df["LGD_stress"]
+def apply_scenario(
+    portfolio: pd.DataFrame,
+    uplifts: pd.DataFrame,
+    scenario: str,
+    cfg: StressTestConfig = StressTestConfig(),
+) -> pd.DataFrame:
+    """Return loan-level dataframe with stressed PD/LGD and projected losses."""
+    return apply_scenarios(portfolio, uplifts, [scenario], cfg=cfg)
 
-    # Useful checks / metadata
-    df["scenario"] = scenario
 
-    # Reorder
-    cols = [
-        "scenario", "loan_id", "sector", "country", "region",
-        "EAD_EUR", "PD_base", "PD_stress", "dPD",
-        "LGD", "LGD_stress",
-        "maturity_years",
-        "pd_uplift", "lgd_uplift",
-        "loss_projected",
-    ]
-    return df[cols]
+def _summary_frame(
+    portfolio: pd.DataFrame,
+    uplifts: pd.DataFrame,
+    scenarios: list[str] = SCENARIOS,
+    cfg: StressTestConfig = StressTestConfig(),
+) -> pd.DataFrame:
+    """
+    Narrow long-form (loan x scenario) frame holding only what summarize needs:
+    the scenario and dimension keys (as categorical codes), loan_id (counted) and the summed columns.
+    """
+    pd_uplift, lgd_uplift = _gather_uplifts(portfolio, uplifts, scenarios)
+    pd_base = portfolio["PD_base"].to_numpy()
+    lgd = portfolio["LGD"].to_numpy()
+    ead = portfolio["EAD_EUR"].to_numpy()
+    res = _compute_losses(pd_base, lgd, ead, pd_uplift, lgd_uplift, cfg.cap_pd)
+
+    n, s = len(portfolio), len(scenarios)
+    keys = {"scenario": pd.Categorical.from_codes(np.repeat(np.arange(s), n), categories=scenarios)}
+    for by in SUMMARY_DIMENSIONS:
+        col = portfolio[by].astype("category")
+        keys[by] = pd.Categorical.from_codes(np.tile(col.cat.codes.to_numpy(), s), categories=col.cat.categories)
+
+    return pd.DataFrame({
+        **keys,
+        "loan_id": np.tile(portfolio["loan_id"].to_numpy(), s),
+        "EAD_EUR": np.tile(ead, s),
+        "PD_base": np.tile(pd_base, s),
+        "LGD": np.tile(lgd, s),
+        "PD_stress": res["PD_stress"].ravel(),
+        "LGD_stress": res["LGD_stress"].ravel(),
+        "loss_projected": res["loss_projected"].ravel(),
+    })
 
 
-def summarize(df: pd.DataFrame, by: str) -> pd.DataFrame:
-    """Aggregate projected losses by a dimension (sector/country/region)."""
-    g = df.groupby(by, dropna=False).agg(
+SUMMARY_MEANS = ["PD_base", "PD_stress", "LGD", "LGD_stress"]
+
+
+def _group_sums(df: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
+    """
+    Per-group loan count, EAD and loss totals, and sums and non-missing counts
+    of the averaged columns (missing values are skipped, as in pandas).
+
+    Sums (not means) so that partial results, e.g. from chunks, can be added up.
+    """
+    if NUMBA_AVAILABLE:
+        # Combine per-key categorical codes into one group code; the last slot
+        # of each key collects missing values (dropna=False semantics)
+        cats, key_codes = [], []
+        for key in keys:
+            col = df[key].astype("category")
+            codes = col.cat.codes.to_numpy().astype(np.intp)
+            codes[codes < 0] = len(col.cat.categories)
+            cats.append(col.cat.categories)
+            key_codes.append(codes)
+        shape = tuple(len(c) + 1 for c in cats)
+        codes = np.ravel_multi_index(key_codes, shape)
+
+        rows, n_loans, sums, counts = group_agg(
+            codes,
+            df["loan_id"].notna().to_numpy(),
+            df["EAD_EUR"].to_numpy(),
+            df["loss_projected"].to_numpy(),
+            df["PD_base"].to_numpy(),
+            df["PD_stress"].to_numpy(),
+            df["LGD"].to_numpy(),
+            df["LGD_stress"].to_numpy(),
+            int(np.prod(shape)),
+        )
+
+        observed = np.flatnonzero(rows > 0)
+        sums, counts = sums[observed], counts[observed]
+        g = pd.DataFrame({
+            key: pd.Categorical.from_codes(np.where(c == len(cat), -1, c), categories=cat)
+            for key, cat, c in zip(keys, cats, np.unravel_index(observed, shape))
+        })
+        return g.assign(**{
+            "n_loans": n_loans[observed],
+            "EAD_EUR": sums[:, 0],
+            "loss_projected": sums[:, 1],
+            **{f"sum_{col}": sums[:, 2 + i] for i, col in enumerate(SUMMARY_MEANS)},
+            **{f"count_{col}": counts[:, 2 + i] for i, col in enumerate(SUMMARY_MEANS)},
+        })
+
+    return df.groupby(keys, observed=True, dropna=False, sort=False).agg(
         n_loans=("loan_id", "count"),
         EAD_EUR=("EAD_EUR", "sum"),
         loss_projected=("loss_projected", "sum"),
-        avg_PD_base=("PD_base", "mean"),
-        avg_PD_stress=("PD_stress", "mean"),
-        avg_LGD=("LGD", "mean"),
-        avg_LGD_stress=("LGD_stress", "mean"),
+        **{f"sum_{col}": (col, "sum") for col in SUMMARY_MEANS},
+        **{f"count_{col}": (col, "count") for col in SUMMARY_MEANS},
     ).reset_index()
 
+
+def _finish_summary(sums: pd.DataFrame) -> pd.DataFrame:
+    """Turn group sums into averages and loss rate, sorted by projected loss."""
+    g = sums.drop(columns=[f"{kind}_{col}" for kind in ("sum", "count") for col in SUMMARY_MEANS])
+    # Averages over non-missing values only (mean with skipna=True); NaN if a group has none
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for col in SUMMARY_MEANS:
+            g[f"avg_{col}"] = sums[f"sum_{col}"].to_numpy() / sums[f"count_{col}"].to_numpy()
+
     g["loss_rate_on_EAD"] = np.where(g["EAD_EUR"] > 0, g["loss_projected"] / g["EAD_EUR"], 0.0)
-    return g.sort_values("loss_projected", ascending=False)
+
+    # Groups come out unsorted (sort=False / code order); order once by loss, descending
+    order = np.argsort(-g["loss_projected"].to_numpy(), kind="stable")
+    return g.iloc[order]
+
+
+def summarize(df: pd.DataFrame, by: str | list[str]) -> pd.DataFrame:
+    """Aggregate projected losses by one or more dimensions (e.g. sector, or scenario x sector)."""
+    keys = [by] if isinstance(by, str) else list(by)
+    return _finish_summary(_group_sums(df, keys))
 
 
 def climate_var(losses: list[float], alpha: float = 0.95) -> float:
-    """Climate VaR: alpha-quantile of scenario losses (loss distribution across scenarios)."""
-    arr = np.asarray(losses, dtype=float)
-    return float(np.percentile(arr, 100.0 * alpha))
+    """Climate VaR: alpha-quantile of scenario losses (loss distribution across scenarios).
+
+    Linear interpolation between order statistics (same value as np.percentile),
+    selected with np.partition in O(n) rather than a full sort.
+    """
+    if not 0.0 <= alpha <= 1.0:
+        raise ValueError(f"alpha must be in [0, 1], got {alpha}")
+    arr = np.asarray(losses)
+    if len(arr) == 0:
+        raise ValueError("climate_var needs at least one scenario loss")
+    if len(arr) < 2:
+        return float(arr[0])
+
+    h = alpha * (len(arr) - 1)
+    lo = int(np.floor(h))
+    hi = min(lo + 1, len(arr) - 1)
+    part = np.partition(arr, [lo, hi])
+    return float(part[lo] + (h - lo) * (part[hi] - part[lo]))
+
+
+def _write_csv(frame: pd.DataFrame, path: Path) -> None:
+    """Write a dataframe to CSV with Arrow's C++ writer (column order preserved)."""
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    pacsv.write_csv(table, path, pacsv.WriteOptions(include_header=True))
+
+
+def _write_parquet(frame: pd.DataFrame, path: Path) -> None:
+    """Write a dataframe to zstd-compressed Parquet (dtypes preserved)."""
+    frame.to_parquet(path, engine="pyarrow", compression="zstd", index=False)
+
+
+OUTPUT_WRITERS = {"csv": _write_csv, "parquet": _write_parquet}
+
+
+def _write_outputs(outputs: list[tuple[pd.DataFrame, Path]], fmt: str = "csv") -> None:
+    """
+    Write independent result files concurrently (I/O-bound, so threads suffice).
+
+    outputs holds (frame, path without extension); fmt is "csv", "parquet" or "both".
+    """
+    formats = list(OUTPUT_WRITERS) if fmt == "both" else [fmt]
+    jobs = [
+        (OUTPUT_WRITERS[f], frame, stem.with_name(f"{stem.name}.{f}"))
+        for frame, stem in outputs
+        for f in formats
+    ]
+    with ThreadPoolExecutor(max_workers=min(len(jobs), 8) or 1) as ex:
+        futures = [ex.submit(writer, frame, path) for writer, frame, path in jobs]
+    for f in futures:
+        f.result()
+
+
+def _open_stream_writer(fmt: str, path: Path, schema: pa.Schema):
+    """Incremental Arrow writer for loan-level results."""
+    if fmt == "csv":
+        return pacsv.CSVWriter(path, schema)
+    return pq.ParquetWriter(path, schema, compression="zstd")
+
+
+def run_chunked(
+    xlsx_path: Path,
+    outdir: Path,
+    chunksize: int,
+    cfg: StressTestConfig = StressTestConfig(),
+    fmt: str = "csv",
+    loan_level: bool = True,
+) -> tuple[int, float, list[tuple[str, float]], dict[str, pd.DataFrame]]:
+    """
+    Run the stress test over the portfolio in chunks of `chunksize` loans.
+
+    With openpyxl installed, rows are streamed from the workbook and memory is
+    bounded by `chunksize`; see _iter_sheet_rows for the calamine-only case.
+
+    Loan-level results are appended to results_<Scenario> files chunk by chunk
+    (skipped with loan_level=False); group sums are accumulated per chunk and merged at the end.
+    Totals and summaries equal a full in-memory run up to floating-point rounding
+    (last digits), since partial sums are added in a different order.
+    Returns (n_loans, total EAD, per-scenario total losses, scenario x dimension summaries).
+    """
+    with pd.ExcelFile(xlsx_path, engine=EXCEL_ENGINE, engine_kwargs=EXCEL_ENGINE_KWARGS) as xl:
+        uplifts = xl.parse("Scenario_Uplifts", dtype=UPLIFTS_DTYPES).dropna(how="all")
+    _require_columns(uplifts, list(UPLIFTS_DTYPES), "Scenario_Uplifts")
+
+    formats = list(OUTPUT_WRITERS) if fmt == "both" else [fmt]
+    writers = {}
+    partials = {by: [] for by in SUMMARY_DIMENSIONS}
+    losses = np.zeros(len(SCENARIOS))
+    n_loans, total_ead = 0, 0.0
+
+    try:
+        for chunk in iter_portfolio_chunks(xlsx_path, chunksize):
+            if loan_level:
+                df = apply_scenarios(chunk, uplifts, SCENARIOS, cfg=cfg)
+            else:
+                df = _summary_frame(chunk, uplifts, SCENARIOS, cfg=cfg)
+            n = len(chunk)
+            n_loans += n
+            total_ead += float(chunk["EAD_EUR"].sum())
+            losses += np.nansum(df["loss_projected"].to_numpy().reshape(len(SCENARIOS), n), axis=1)
+
+            for by in SUMMARY_DIMENSIONS:
+                partials[by].append(_group_sums(df, ["scenario", by]))
+
+            if not loan_level:
+                continue
+
+            # Plain string keys keep the Arrow schema identical from one chunk to the next
+            table = pa.Table.from_pandas(
+                df.astype({col: "string" for col in ("scenario", "sector", "country", "region")}),
+                preserve_index=False,
+            )
+            for j, sc in enumerate(SCENARIOS):
+                for f in formats:
+                    if (sc, f) not in writers:
+                        writers[sc, f] = _open_stream_writer(f, outdir / f"results_{sc}.{f}", table.schema)
+                    writers[sc, f].write_table(table.slice(j * n, n))
+    finally:
+        for w in writers.values():
+            w.close()
+
+    summaries = {}
+    for by, parts in partials.items():
+        keys = ["scenario", by]
+        sums = pd.concat(parts, ignore_index=True)
+        summaries[by] = _finish_summary(
+            sums.groupby(keys, observed=True, dropna=False, sort=False).sum().reset_index()
+        )
+
+    return n_loans, total_ead, list(zip(SCENARIOS, losses.tolist())), summaries
+
+
+def _positive_int(value: str) -> int:
+    """argparse type for strictly positive integers."""
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return n
 
 
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", type=str, default="portfolio_climat.xlsx", help="Path to input Excel file.")
     parser.add_argument("--alpha", type=float, default=0.95, help="VaR confidence level, e.g. 0.95.")
-    parser.add_argument("--outdir", type=str, default=".", help="Output directory for CSV results.")
+    parser.add_argument("--outdir", type=str, default=".", help="Output directory for results.")
+    parser.add_argument(
+        "--format",
+        choices=["csv", "parquet", "both"],
+        default="csv",
+        help="Output file format for results and summaries.",
+    )
+    parser.add_argument(
+        "--cache",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Reuse a Parquet copy of the input sheets while the Excel file is unchanged.",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=_positive_int,
+        default=None,
+        help="Stream the portfolio in chunks of N loans (memory is bounded only when openpyxl is installed).",
+    )
+    parser.add_argument(
+        "--loan-level",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Write loan-level results_<Scenario> files (--no-loan-level: summaries and VaR only).",
+    )
     args = parser.parse_args()
+    if args.chunksize is not None and args.cache:
+        parser.error("--cache cannot be combined with --chunksize (streamed input is not cached)")
 
     xlsx_path = Path(args.input).expanduser().resolve()
     outdir = Path(args.outdir).expanduser().resolve()
@@ -162,30 +686,48 @@ def main() -> None:
 
     cfg = StressTestConfig(alpha=float(args.alpha))
 
-    portfolio, uplifts = load_inputs(xlsx_path)
+    outputs = []  # (frame, path without extension) pairs, written together at the end
 
-    # Sanity check: total exposure
-    total_ead = float(portfolio["EAD_EUR"].sum())
-    print(f"[INFO] Loaded {len(portfolio)} loans | Total EAD = {total_ead:,.0f} EUR")
+    if args.chunksize is not None:
+        # Loan-level results are streamed to disk inside run_chunked
+        n_loans, total_ead, scenario_totals, summaries = run_chunked(
+            xlsx_path, outdir, args.chunksize, cfg=cfg, fmt=args.format, loan_level=args.loan_level
+        )
+        print(f"[INFO] Streamed {n_loans} loans in chunks of {args.chunksize} | Total EAD = {total_ead:,.0f} EUR")
+    else:
+        portfolio, uplifts = load_inputs(xlsx_path, cache=args.cache)
 
-    scenario_totals = []
+        # Sanity check: total exposure
+        total_ead = float(portfolio["EAD_EUR"].sum())
+        print(f"[INFO] Loaded {len(portfolio)} loans | Total EAD = {total_ead:,.0f} EUR")
 
-    for sc in SCENARIOS:
-        df_sc = apply_scenario(portfolio, uplifts, sc, cfg=cfg)
+        n = len(portfolio)
+        if args.loan_level:
+            all_df = apply_scenarios(portfolio, uplifts, SCENARIOS, cfg=cfg)
 
-        total_loss = float(df_sc["loss_projected"].sum())
-        scenario_totals.append((sc, total_loss))
+            # Loan-level results (one contiguous block of rows per scenario)
+            for j, sc in enumerate(SCENARIOS):
+                outputs.append((all_df.iloc[j * n:(j + 1) * n], outdir / f"results_{sc}"))
+        else:
+            # Aggregates only: no loan-level frame, just keys and summed columns
+            all_df = _summary_frame(portfolio, uplifts, SCENARIOS, cfg=cfg)
 
-        # Loan-level results
-        df_sc.to_csv(outdir / f"results_{sc}.csv", index=False)
+        # Totals over SCENARIOS explicitly (zero for an empty portfolio); missing losses are skipped
+        losses = np.nansum(all_df["loss_projected"].to_numpy().reshape(len(SCENARIOS), n), axis=1)
+        scenario_totals = list(zip(SCENARIOS, losses.tolist()))
 
-        # Summaries
-        summarize(df_sc, "sector").to_csv(outdir / f"summary_by_sector_{sc}.csv", index=False)
-        summarize(df_sc, "country").to_csv(outdir / f"summary_by_country_{sc}.csv", index=False)
-        summarize(df_sc, "region").to_csv(outdir / f"summary_by_region_{sc}.csv", index=False)
+        # Summaries: one reduction per dimension across all scenarios
+        summaries = {by: summarize(all_df, ["scenario", by]) for by in SUMMARY_DIMENSIONS}
 
+    for sc, total_loss in scenario_totals:
         print(f"[INFO] Scenario {sc}: projected loss = {total_loss:,.0f} EUR")
 
+    # Split each summary per scenario (every scenario gets a file, even if empty)
+    for by, g in summaries.items():
+        for sc in SCENARIOS:
+            sub = g[g["scenario"] == sc]
+            outputs.append((sub.drop(columns="scenario"), outdir / f"summary_by_{by}_{sc}"))
+
     # Climate VaR across scenario totals (pedagogical: distribution over NGFS-like scenarios)
     losses_only = [x[1] for x in scenario_totals]
     var_alpha = climate_var(losses_only, alpha=cfg.alpha)
@@ -195,7 +737,9 @@ def main() -> None:
         "total_loss_projected": losses_only,
     })
     var_df.loc[len(var_df)] = [f"ClimateVaR_{int(cfg.alpha*100)}%", var_alpha]
-    var_df.to_csv(outdir / "climate_var_summary.csv", index=False)
+    outputs.append((var_df, outdir / "climate_var_summary"))
+
+    _write_outputs(outputs, fmt=args.format)
 
     print(f"[INFO] Climate VaR {int(cfg.alpha*100)}% (across scenarios) = {var_alpha:,.0f} EUR")
     print(f"[DONE] Outputs written to: {outdir}")
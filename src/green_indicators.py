@@ -1,15 +1,24 @@
+import numpy as np
 import pandas as pd
 
 
+def _green_sector_mask(df):
+    # Exemple simple : secteurs contenant "renewable"
+    # Test fait une fois par catégorie, puis propagé aux lignes via les codes
+    # (code -1 = secteur manquant -> non vert)
+    sector = df["sector"].astype("category")
+    green_cats = np.asarray(sector.cat.categories.astype(str).str.lower().str.contains("renewable"), dtype=bool)
+    return np.append(green_cats, False)[sector.cat.codes.to_numpy()]
+
+
 def green_financing_share(df, **params):
     total = df["EAD_EUR"].sum()
     if total == 0:
         return 0.0
 
-    # Exemple simple : secteurs contenant "renewable"
-    green_mask = df["sector"].str.lower().str.contains("renewable", na=False)
+    green_mask = _green_sector_mask(df)
 
-    green_ead = df.loc[green_mask, "EAD_EUR"].sum()
+    green_ead = np.nansum(df["EAD_EUR"].to_numpy()[green_mask])
 
     return green_ead / total
 
@@ -34,3 +43,34 @@ def sbti_client_share(df, **params):
     aligned_clients = df.loc[df["PD_base"] < 0.02].shape[0]
 
     return aligned_clients / total_clients
+
+
+def compute_green_indicators(df, **params):
+    """
+    Les trois indicateurs verts en un seul passage sur le portefeuille
+    (colonnes extraites une fois, EAD total calculé une fois).
+    Les EAD manquants sont ignorés, comme dans les fonctions individuelles.
+
+    Renvoie un dict : fonction utilitaire, volontairement hors du registre
+    INDICATORS (un indicateur = une valeur).
+    """
+    ead = df["EAD_EUR"].to_numpy()
+    total = np.nansum(ead)
+    total_clients = len(df)
+
+    if total == 0:
+        green_financing, green_bond = 0.0, 0.0
+    else:
+        green_financing = np.nansum(ead[_green_sector_mask(df)]) / total
+        green_bond = np.nansum(ead[df["maturity_years"].to_numpy() > 10]) / total
+
+    if total_clients == 0:
+        sbti = 0.0
+    else:
+        sbti = np.count_nonzero(df["PD_base"].to_numpy() < 0.02) / total_clients
+
+    return {
+        "green_financing_share": green_financing,
+        "green_bond_share": green_bond,
+        "sbti_client_share": sbti,
+    }
@@ -3,18 +3,28 @@ Central registry of climate indicators.
 
 The final notebook imports INDICATORS from here, so we standardize names once
 and everyone codes behind these names in their own module.
+
+Indicator modules are imported lazily, the first time one of their functions
+is looked up, so importing the registry stays cheap.
 """
 
-def _safe_import(module_path: str, func_names: list[str]):
+import functools
+import importlib
+from collections.abc import Mapping
+
+
+@functools.cache
+def _safe_import(module_path: str, func_names: tuple[str, ...]):
     """
     Try to import functions. If missing, keep track so the project doesn't crash.
+    Cached, so each module is imported at most once.
     Returns: (available_dict, missing_list)
     """
     available = {}
     missing = []
 
     try:
-        module = __import__(module_path, fromlist=["*"])
+        module = importlib.import_module(module_path)
     except Exception as e:
         # module itself missing or has error
         for fn in func_names:
@@ -66,22 +76,63 @@ _SPECS = [
     ]),
 ]
 
-INDICATORS = {}
-MISSING = []
+# Failures recorded so far; read through MISSING, which resolves every module first
+_MISSING = []
+
+
+class _IndicatorRegistry(Mapping):
+    """
+    Read-only {function_name: function} mapping over _SPECS.
+
+    Looking up a name imports only the module that owns it; iterating or
+    taking len() resolves every module. Failures are recorded in MISSING.
+    """
+
+    def __init__(self, specs):
+        self._specs = {module_path: tuple(funcs) for module_path, funcs in specs}
+        self._owner = {fn: module_path for module_path, funcs in specs for fn in funcs}
+
+    def _resolve(self, module_path: str) -> dict:
+        ok, missing = _safe_import(module_path, self._specs[module_path])
+        for item in missing:
+            if item not in _MISSING:
+                _MISSING.append(item)
+        return ok
+
+    def resolve_all(self) -> None:
+        for module_path in self._specs:
+            self._resolve(module_path)
+
+    def __getitem__(self, name):
+        if name not in self._owner:
+            raise KeyError(name)
+        return self._resolve(self._owner[name])[name]
+
+    def __iter__(self):
+        self.resolve_all()
+        return iter([fn for fn in self._owner if fn in self._resolve(self._owner[fn])])
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+INDICATORS = _IndicatorRegistry(_SPECS)
+
 
-for module_path, funcs in _SPECS:
-    ok, missing = _safe_import(module_path, funcs)
-    # Store with stable keys "module:function"
-    for name, fn in ok.items():
-        INDICATORS[name] = fn
-    MISSING.extend(missing)
+def __getattr__(name):
+    # MISSING is computed on access so it is complete, as when every module was imported eagerly
+    if name == "MISSING":
+        INDICATORS.resolve_all()
+        return _MISSING
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def print_missing():
     """Helper to display what's missing (useful at the beginning of the project)."""
-    if not MISSING:
+    INDICATORS.resolve_all()
+    if not _MISSING:
         print("✅ All indicators are available.")
         return
     print("⚠️ Missing / broken indicator functions:")
-    for item in MISSING:
+    for item in _MISSING:
         print(" -", item)